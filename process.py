@@ -0,0 +1,399 @@
+########################################################################
+# import python-library
+########################################################################
+# default
+import io
+import os
+import re
+import mmap
+import hashlib
+import logging
+import argparse
+import tempfile
+import itertools
+import subprocess
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener
+
+# additional
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+from tqdm import tqdm
+try:
+    import soxr
+except ImportError:
+    soxr = None
+########################################################################
+
+########################################################################
+# target format of the combined recordings
+########################################################################
+TARGET_SR = 32000
+TARGET_CHANNELS = 1
+TARGET_WIDTH = 2  # bytes per sample (16 bit)
+TARGET_SUBTYPE = "PCM_16"
+
+# normalized raw-PCM shards reused across reruns (e.g. files_per_group tuning)
+CACHE_DIR = os.path.join("data", ".pcm_cache")
+########################################################################
+
+# recording file name : <prefix>_<YYYYMMDD>_<HHMMSS>.wav
+_RX = re.compile(r".*_(\d{8})_(\d{6})\.wav$")
+
+
+def sniff_wav_params(path):
+    """
+    Read only the WAV header and return (sample_rate, channels, subtype).
+    Returns None when the header is broken or not readable by libsndfile.
+    """
+    try:
+        info = sf.info(path)
+        return info.samplerate, info.channels, info.subtype
+    except (RuntimeError, OSError):
+        return None
+
+
+def robust_load_audio(path):
+    """
+    Load a wav file as an int16 array through libsndfile, with fallbacks
+    for the broken captures seen in the field recordings:
+    1. plain sf.read
+    2. garbage bytes before the RIFF header -> trim and retry
+    3. no parsable header at all -> treat the payload as raw PCM
+    Returns (data, sample_rate).
+    """
+    try:
+        return sf.read(path, dtype="int16", always_2d=False)
+    except RuntimeError:
+        pass
+    # memory-map instead of reading the whole file : the RIFF search only
+    # touches the pages it visits, and the raw-PCM view is zero-copy
+    with open(path, "rb") as fp:
+        mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        riff_pos = mm.find(b"RIFF")
+        if riff_pos > 0:
+            try:
+                return sf.read(io.BytesIO(mm[riff_pos:]),
+                               dtype="int16", always_2d=False)
+            except RuntimeError:
+                pass
+            # libsndfile rejected the buffer : trimmed-file retry through
+            # an anonymous O_TMPFILE, which is never linked into a
+            # directory and is reclaimed by the kernel on close
+            trimmed_fd = None
+            try:
+                trimmed_fd = os.open(tempfile.gettempdir(),
+                                     os.O_TMPFILE | os.O_RDWR, 0o600)
+            except (AttributeError, OSError):
+                pass
+            if trimmed_fd is not None:
+                try:
+                    with os.fdopen(trimmed_fd, "r+b") as tmp:
+                        tmp.write(mm[riff_pos:])
+                        tmp.seek(0)
+                        return sf.read(tmp, dtype="int16", always_2d=False)
+                except RuntimeError:
+                    pass
+            else:
+                # platforms/filesystems without O_TMPFILE
+                fd, trimmed_path = tempfile.mkstemp(suffix=".wav")
+                try:
+                    with os.fdopen(fd, "wb") as out:
+                        out.write(mm[riff_pos:])
+                    return sf.read(trimmed_path,
+                                   dtype="int16", always_2d=False)
+                except RuntimeError:
+                    pass
+                finally:
+                    os.remove(trimmed_path)
+        # last resort : assume headerless raw PCM at the target spec.
+        # copy in one expression so the buffer view is released before
+        # mm.close(), which refuses to close with exported pointers
+        offset = riff_pos + 44 if riff_pos >= 0 else 0
+        data = np.frombuffer(mm, dtype=np.int16, offset=offset,
+                             count=(len(mm) - offset) // 2).copy()
+        return data, TARGET_SR
+    finally:
+        mm.close()
+
+
+def normalize(data, sr):
+    """
+    Downmix to mono and resample to TARGET_SR, keeping 16-bit PCM.
+    """
+    if data.ndim > 1:
+        data = data.mean(axis=1)
+    if sr != TARGET_SR:
+        if soxr is not None:
+            # libsoxr is ~10x faster than the polyphase scipy path
+            data = soxr.resample(data.astype(np.float32), sr, TARGET_SR,
+                                 quality="HQ")
+        else:
+            g = math.gcd(TARGET_SR, sr)
+            data = resample_poly(data.astype(np.float64),
+                                 TARGET_SR // g, sr // g)
+    if data.dtype != np.int16:
+        # round and clip in place; the astype copy is the only new buffer
+        np.rint(data, out=data)
+        np.clip(data, -32768, 32767, out=data)
+        data = data.astype(np.int16)
+    return data
+
+
+def _cache_path(path):
+    """
+    Cache shard location for a source file, keyed by
+    (absolute path, mtime, target spec).
+    """
+    key = hashlib.blake2b(
+        "{}|{}|{}|{}|{}".format(
+            os.path.abspath(path), os.stat(path).st_mtime_ns,
+            TARGET_SR, TARGET_CHANNELS, TARGET_WIDTH).encode(),
+        digest_size=16).hexdigest()
+    return os.path.join(CACHE_DIR, key + ".s16")
+
+
+def _load_normalized(path):
+    """
+    robust_load_audio + normalize with the error captured instead of
+    raised, so thread maps keep their input order. Normalized PCM is
+    cached on disk keyed by (path, mtime, target spec); rerunning with a
+    different grouping then costs a memmap open instead of a decode.
+    """
+    try:
+        cache_path = _cache_path(path)
+        if os.path.exists(cache_path):
+            return np.memmap(cache_path, dtype=np.int16, mode="r"), None
+        data, sr = robust_load_audio(path)
+        data = normalize(data, sr)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        # write-then-rename so an interrupted worker can never leave a
+        # truncated shard behind a valid cache key
+        tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+        data.tofile(tmp_path)
+        os.replace(tmp_path, cache_path)
+        return data, None
+    except Exception as e:
+        return None, e
+
+
+def concat_files(paths, out_path):
+    """
+    Concatenate WAV files sharing the target spec with the ffmpeg concat
+    demuxer and stream copy (no decode, no re-encode). The file list is
+    fed on stdin so no per-group list file is created on disk.
+    """
+    script = "".join(
+        "file '{}'\n".format(os.path.abspath(path).replace("'", "'\\''"))
+        for path in paths)
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat",
+             "-safe", "0", "-protocol_whitelist", "file,pipe",
+             "-i", "pipe:0", "-c", "copy", out_path],
+            input=script.encode(),
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except OSError as e:
+        # e.g. no ffmpeg binary : the caller falls back to decoding
+        logging.warning("concat unavailable : {} : {}".format(out_path, e))
+        return False
+    if result.returncode != 0:
+        logging.error("concat failed : {} : {}".format(
+            out_path, result.stderr.decode(errors="replace").strip()))
+        return False
+    return True
+
+
+def process_group(group_index, group_files, input_dir, output_dir):
+    """
+    Combine one group of source files into combined_<index>.wav.
+    Groups are fully independent, so this runs in a worker process.
+    Returns (ok, failed_files) for the summary in the parent.
+    """
+    out_path = os.path.join(
+        output_dir, "combined_{:04d}.wav".format(group_index))
+    paths = [os.path.join(input_dir, fn) for fn in group_files]
+
+    # fast path : every file already matches the target spec, so the group
+    # is merged by ffmpeg with stream copy and never decoded here; if the
+    # concat fails (e.g. no ffmpeg binary) the decode path below still
+    # produces the group
+    if all(sniff_wav_params(path) == (TARGET_SR, TARGET_CHANNELS,
+                                      TARGET_SUBTYPE)
+           for path in paths):
+        if concat_files(paths, out_path):
+            logging.info("group {} : {} files -> {}".format(
+                group_index, len(paths), out_path))
+            return True, []
+
+    # slow path : decode through libsndfile, normalize in NumPy and write
+    # the merged PCM once. Sizing every file up front lets the group fill
+    # one preallocated buffer instead of per-file arrays plus a concat copy.
+    failed_files = []
+    entries = []  # (file name, fill mode, payload, normalized frames)
+    eager_paths = []
+    for fn, path in zip(group_files, paths):
+        cache_path = _cache_path(path)
+        if os.path.exists(cache_path):
+            entries.append(
+                (fn, "cache", cache_path,
+                 os.path.getsize(cache_path) // TARGET_WIDTH))
+            continue
+        try:
+            info = sf.info(path)
+        except (RuntimeError, OSError):
+            info = None
+        if info is not None and info.samplerate == TARGET_SR \
+                and info.channels == TARGET_CHANNELS:
+            entries.append((fn, "read", path, info.frames))
+        else:
+            # repair/resample changes the frame count, so these must be
+            # decoded before the buffer can be sized
+            entries.append((fn, "decode", path, 0))
+            eager_paths.append(path)
+
+    if eager_paths:
+        with ThreadPoolExecutor(max_workers=8) as tp:
+            decoded = dict(zip(
+                eager_paths, tp.map(_load_normalized, eager_paths)))
+        sized = []
+        for fn, mode, payload, frames in entries:
+            if mode != "decode":
+                sized.append((fn, mode, payload, frames))
+                continue
+            data, err = decoded[payload]
+            if err is not None:
+                logging.error("load failed : {} : {}".format(fn, err))
+                failed_files.append(fn)
+            else:
+                sized.append((fn, "array", data, len(data)))
+        entries = sized
+
+    if not entries:
+        logging.error(
+            "group {} : no loadable files, skipped".format(group_index))
+        return False, failed_files
+
+    offsets = np.concatenate(
+        ([0], np.cumsum([frames for _, _, _, frames in entries])))
+    combined = np.empty(offsets[-1], dtype=np.int16)
+
+    def _fill(i):
+        _, mode, payload, frames = entries[i]
+        dst = combined[offsets[i]:offsets[i + 1]]
+        try:
+            if mode == "cache":
+                dst[:] = np.fromfile(payload, dtype=np.int16, count=frames)
+            elif mode == "read":
+                with sf.SoundFile(payload) as f:
+                    got = f.read(frames, out=dst)
+                dst[len(got):] = 0
+            else:
+                dst[:] = payload
+            return None
+        except Exception as e:
+            dst[:] = 0
+            return e
+
+    # libsndfile releases the GIL and the slices are disjoint, so the
+    # fills overlap on threads
+    with ThreadPoolExecutor(max_workers=8) as tp:
+        for entry, err in zip(entries, tp.map(_fill, range(len(entries)))):
+            if err is not None:
+                logging.error(
+                    "read failed, zero-filled : {} : {}".format(entry[0], err))
+                failed_files.append(entry[0])
+
+    sf.write(out_path, combined, TARGET_SR, subtype="PCM_16")
+    logging.info("group {} : {} files -> {}".format(
+        group_index, len(entries), out_path))
+    return True, failed_files
+
+
+def _init_worker(log_queue):
+    """
+    Route all log records of a worker process into the parent's queue
+    so combine_log.txt has a single writer.
+    """
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(log_queue)]
+    root.setLevel(logging.INFO)
+
+
+def main(input_dir, output_dir, files_per_group):
+    os.makedirs(output_dir, exist_ok=True)
+
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    file_handler = logging.FileHandler(
+        os.path.join(output_dir, "combine_log.txt"))
+    file_handler.setFormatter(formatter)
+    # batch INFO lines so the log file is not written per message;
+    # errors flush immediately
+    buffered_handler = MemoryHandler(
+        capacity=1024, flushLevel=logging.ERROR, target=file_handler)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+    log_queue = multiprocessing.Queue()
+    listener = QueueListener(log_queue, buffered_handler, stream_handler)
+    listener.start()
+    _init_worker(log_queue)  # the parent logs through the same queue
+
+    # scandir streams DirEntry objects instead of materializing the whole
+    # directory listing first
+    file_times = []
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            name = entry.name
+            if not name.lower().endswith(".wav"):
+                continue
+            m = _RX.match(name)
+            if m is None:
+                logging.warning(
+                    "unexpected file name, skipped : {}".format(name))
+                continue
+            # (date, time) as plain ints sorts identically to the datetime
+            # and skips strptime entirely
+            file_times.append((name, (int(m.group(1)), int(m.group(2)))))
+    file_times.sort(key=lambda x: x[1])
+    sorted_files = [f for f, _ in file_times]
+    logging.info("{} files found in {}".format(len(sorted_files), input_dir))
+
+    groups = [sorted_files[i:i + files_per_group]
+              for i in range(0, len(sorted_files), files_per_group)]
+    with ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            initializer=_init_worker, initargs=(log_queue,)) as executor:
+        results = list(tqdm(
+            executor.map(process_group,
+                         range(len(groups)), groups,
+                         itertools.repeat(input_dir),
+                         itertools.repeat(output_dir),
+                         chunksize=1),
+            total=len(groups)))
+
+    n_groups = sum(1 for ok, _ in results if ok)
+    failed_files = [fn for _, fails in results for fn in fails]
+    logging.info("combined groups : {}".format(n_groups))
+    logging.info("failed files : {}".format(len(failed_files)))
+    for fn in failed_files:
+        logging.info("\t{}".format(fn))
+    listener.stop()
+    buffered_handler.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description="Combine short recordings into fixed-size groups")
+    parser.add_argument("--input_dir", type=str, required=True,
+                        help="directory containing the source wav files")
+    parser.add_argument("--output_dir", type=str, required=True,
+                        help="directory to write the combined wav files")
+    parser.add_argument("--files_per_group", type=int, default=200,
+                        help="number of source files per combined file")
+    args = parser.parse_args()
+
+    main(args.input_dir, args.output_dir, args.files_per_group)
@@ -0,0 +1,241 @@
+########################################################################
+# import python-library
+########################################################################
+# default
+import os
+import math
+import mmap
+import wave
+import struct
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+# additional
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+from tqdm import tqdm
+try:
+    import soxr
+except ImportError:
+    soxr = None
+########################################################################
+
+
+def parse_hms_or_seconds(s):
+    """
+    Parse "HH:MM:SS(.fff)" or a plain seconds value into seconds.
+    """
+    s = s.strip()
+    try:
+        return float(s)
+    except ValueError:
+        pass
+    parts = s.split(":")
+    if len(parts) != 3:
+        raise ValueError("time must be seconds or HH:MM:SS : {}".format(s))
+    h, m, sec = parts
+    return int(h) * 3600 + int(m) * 60 + float(sec)
+
+
+_HMS_FORMAT = "{:02d}{:02d}{:02d}".format
+
+
+def hms_from_seconds(sec):
+    """
+    Format seconds as "HHMMSS" for chunk file names. Floor rather than
+    round : floors of starts spaced >= 1 s apart can never collide,
+    while rounding maps e.g. 3.5 and 4.5 both to 4.
+    """
+    sec = math.floor(sec)
+    return _HMS_FORMAT(sec // 3600, sec % 3600 // 60, sec % 60)
+
+
+def _pcm_wav_layout(mm):
+    """
+    Walk the RIFF chunks of a plain PCM wav and return
+    (channels, sample_rate, sample_width, data_offset, data_size).
+    Raises wave.Error for anything that is not uncompressed PCM.
+    """
+    if mm[:4] != b"RIFF" or mm[8:12] != b"WAVE":
+        raise wave.Error("not a RIFF wav")
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(mm):
+        chunk_id = mm[pos:pos + 4]
+        chunk_size = int.from_bytes(mm[pos + 4:pos + 8], "little")
+        body = pos + 8
+        if chunk_id == b"fmt ":
+            if int.from_bytes(mm[body:body + 2], "little") != 1:
+                raise wave.Error("not uncompressed PCM")
+            channels = int.from_bytes(mm[body + 2:body + 4], "little")
+            sr = int.from_bytes(mm[body + 4:body + 8], "little")
+            sampwidth = int.from_bytes(mm[body + 14:body + 16], "little") // 8
+            fmt = (channels, sr, sampwidth)
+        elif chunk_id == b"data" and fmt is not None:
+            return fmt + (body, min(chunk_size, len(mm) - body))
+        pos = body + chunk_size + (chunk_size & 1)
+    raise wave.Error("fmt/data chunk not found")
+
+
+def _pcm_wav_header(channels, sr, sampwidth, n_bytes):
+    """
+    Build the 44-byte PCM wav header for a data chunk of n_bytes.
+    """
+    block_align = channels * sampwidth
+    return (b"RIFF" + struct.pack("<I", 36 + n_bytes) + b"WAVEfmt "
+            + struct.pack("<IHHIIHH", 16, 1, channels, sr,
+                          sr * block_align, block_align, sampwidth * 8)
+            + b"data" + struct.pack("<I", n_bytes))
+
+
+def slice_by_copy(in_path, output_dir, stem, start_sec, end_sec,
+                  chunk_sec, drop_last):
+    """
+    Chunks of a PCM wav are contiguous byte ranges of its data chunk, so
+    each export is a fresh 44-byte header plus one byte-range copy out of
+    the mmapped input - no decode, no encode.
+    """
+    with open(in_path, "rb") as fp:
+        mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        channels, sr, sampwidth, data_off, data_size = _pcm_wav_layout(mm)
+        block_align = channels * sampwidth
+        total_frames = data_size // block_align
+        start_frame = int(round(start_sec * sr))
+        end_frame = total_frames if end_sec is None \
+            else min(total_frames, int(round(end_sec * sr)))
+        chunk_frames = int(round(chunk_sec * sr))
+        # all full chunks share one header; only a short tail differs
+        full_header = _pcm_wav_header(
+            channels, sr, sampwidth, chunk_frames * block_align)
+
+        n_chunks = 0
+        pos = start_frame
+        while pos < end_frame:
+            nxt = min(pos + chunk_frames, end_frame)
+            if drop_last and nxt - pos < chunk_frames:
+                break
+            n_bytes = (nxt - pos) * block_align
+            header = full_header if nxt - pos == chunk_frames \
+                else _pcm_wav_header(channels, sr, sampwidth, n_bytes)
+            out_path = os.path.join(
+                output_dir, "{}_{}.wav".format(stem, hms_from_seconds(pos / sr)))
+            with open(out_path, "wb") as out:
+                out.write(header)
+                out.write(mm[data_off + pos * block_align:
+                             data_off + pos * block_align + n_bytes])
+            n_chunks += 1
+            pos = nxt
+        return n_chunks
+    finally:
+        mm.close()
+
+
+def _export_chunk(task):
+    """
+    Read one chunk from the input, apply any requested conversion and
+    write it. Top-level so process pools can pickle it.
+    """
+    in_path, out_path, pos, frames, sr, out_sr, channels = task
+    with sf.SoundFile(in_path) as f:
+        f.seek(pos)
+        data = f.read(frames, dtype="int16", always_2d=False)
+    if channels == 1 and data.ndim > 1:
+        data = data.mean(axis=1)
+    if out_sr != sr:
+        if soxr is not None:
+            data = soxr.resample(data.astype(np.float32), sr, out_sr,
+                                 quality="HQ")
+        else:
+            g = math.gcd(out_sr, sr)
+            data = resample_poly(data.astype(np.float64),
+                                 out_sr // g, sr // g)
+    if data.dtype != np.int16:
+        data = np.clip(np.rint(data), -32768, 32767).astype(np.int16)
+    sf.write(out_path, data, out_sr, subtype="PCM_16")
+
+
+def main(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(args.input))[0]
+    start_sec = parse_hms_or_seconds(args.start)
+    end_sec = parse_hms_or_seconds(args.end) if args.end else None
+
+    # fast path : no format change requested, so slice raw PCM bytes
+    if args.sr is None and args.channels is None:
+        try:
+            n_chunks = slice_by_copy(
+                args.input, args.output_dir, stem, start_sec, end_sec,
+                args.chunk, args.drop_last)
+            print("{} chunks -> {}".format(n_chunks, args.output_dir))
+            return
+        except wave.Error:
+            pass  # not plain PCM : fall through to the decode path
+
+    with sf.SoundFile(args.input) as f:
+        sr = f.samplerate
+        total_frames = len(f)
+    if end_sec is None:
+        end_sec = total_frames / sr
+    start_frame = int(round(start_sec * sr))
+    end_frame = min(total_frames, int(round(end_sec * sr)))
+    chunk_frames = int(round(args.chunk * sr))
+    out_sr = args.sr if args.sr else sr
+
+    # chunks are independent (pos, frames) reads of the same input, so
+    # they are planned up front and exported serially or across --jobs
+    tasks = []
+    pos = start_frame
+    while pos < end_frame:
+        nxt = min(pos + chunk_frames, end_frame)
+        if args.drop_last and nxt - pos < chunk_frames:
+            break
+        out_path = os.path.join(
+            args.output_dir,
+            "{}_{}.wav".format(
+                stem, hms_from_seconds((pos - start_frame) / sr + start_sec)))
+        tasks.append((args.input, out_path, pos, nxt - pos,
+                      sr, out_sr, args.channels))
+        pos = nxt
+
+    if args.jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            list(tqdm(executor.map(_export_chunk, tasks, chunksize=1),
+                      total=len(tasks)))
+    else:
+        for task in tasks:
+            _export_chunk(task)
+
+    print("{} chunks -> {}".format(len(tasks), args.output_dir))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+            description="Slice a long recording into fixed-length chunks")
+    parser.add_argument("--input", type=str, required=True,
+                        help="source wav file")
+    parser.add_argument("--output_dir", type=str, required=True,
+                        help="directory to write the chunk wav files")
+    parser.add_argument("--start", type=str, default="0",
+                        help="slice start, seconds or HH:MM:SS")
+    parser.add_argument("--end", type=str, default=None,
+                        help="slice end, seconds or HH:MM:SS (default: EOF)")
+    parser.add_argument("--chunk", type=float, default=15.0,
+                        help="chunk length in seconds")
+    parser.add_argument("--drop_last", action="store_true",
+                        help="drop the last chunk when shorter than --chunk")
+    parser.add_argument("--sr", type=int, default=None,
+                        help="resample chunks to this rate")
+    parser.add_argument("--channels", type=int, default=None, choices=[1],
+                        help="downmix chunks to this channel count")
+    parser.add_argument("--jobs", type=int,
+                        default=max(1, (os.cpu_count() or 2) // 2),
+                        help="parallel workers for the conversion path")
+    args = parser.parse_args()
+    if args.chunk < 1:
+        # chunk names carry HHMMSS (1-second) resolution, so shorter
+        # chunks would collide and overwrite each other
+        parser.error("--chunk must be at least 1 second")
+
+    main(args)